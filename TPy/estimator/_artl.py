@@ -2,12 +2,11 @@
 # Author: Shuo Zhou, szhou20@sheffield.ac.uk, The University of Sheffield
 # =============================================================================
 import numpy as np
-from numpy.linalg import multi_dot
 from sklearn.utils.validation import check_is_fitted
 from sklearn.metrics.pairwise import pairwise_kernels
 from sklearn.preprocessing import LabelBinarizer
-from ..utils.multiclass import score2pred
-from ..utils import lap_norm, mmd_coef
+from ..utils import lap_norm, mmd_coef, sym_kernel
+from ..utils._base import _as_array, _stack
 from .base import SSLFramework
 # =============================================================================
 # Adaptation Regularisation Transfer Learning: ARTL
@@ -46,8 +45,10 @@ def _init_artl(Xs, ys, Xt=None, yt=None, **kwargs):
 
     """
 
-    if type(Xt) == np.ndarray:
-        X = np.concatenate([Xs, Xt], axis=0)
+    Xs = _as_array(Xs)
+    if Xt is not None:
+        Xt = _as_array(Xt)
+        X = _stack(Xs, Xt)
         ns = Xs.shape[0]
         nt = Xt.shape[0]
         M = mmd_coef(ns, nt, ys, yt, kind='joint')
@@ -60,8 +61,8 @@ def _init_artl(Xs, ys, Xt=None, yt=None, **kwargs):
     else:
         y = ys.copy()
     n = X.shape[0]
-    ker_x = pairwise_kernels(X, **kwargs)
-    ker_x[np.isnan(ker_x)] = 0
+    ker_x = sym_kernel(X, **kwargs)
+    np.nan_to_num(ker_x, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
     unit_mat = np.eye(n)
 
     return X, y, ker_x, M, unit_mat
@@ -69,7 +70,8 @@ def _init_artl(Xs, ys, Xt=None, yt=None, **kwargs):
 
 class ARSVM(SSLFramework):
     def __init__(self, C=1.0, kernel='linear', lambda_=1.0, gamma_=0.0, k_neighbour=5,
-                 solver='osqp', manifold_metric='cosine', knn_mode='distance', **kwargs):
+                 solver='osqp', manifold_metric='cosine', knn_mode='distance',
+                 warm_start=False, **kwargs):
         """Adaptation Regularised Support Vector Machine
 
         Parameters
@@ -96,6 +98,10 @@ class ARSVM(SSLFramework):
             returned matrix: ‘connectivity’ will return the connectivity 
             matrix with ones and zeros, and ‘distance’ will return the 
             distances between neighbors according to the given metric.
+        warm_start : bool, optional
+            whether the osqp solve of each one-vs-rest class is warm started
+            from the previous class, by default False. At the default osqp
+            tolerances the solution can then differ from independent solves
         kwargs :
             kernel param
         """
@@ -109,6 +115,7 @@ class ARSVM(SSLFramework):
         # self.alpha = None
         self.knn_mode = knn_mode
         self.manifold_metric = manifold_metric
+        self.warm_start = warm_start
         self._lb = LabelBinarizer(pos_label=1, neg_label=-1)
         # self.scaler = StandardScaler()
 
@@ -132,13 +139,16 @@ class ARSVM(SSLFramework):
 
         y_ = self._lb.fit_transform(y)
 
+        A = self.lambda_ * M
         if self.gamma_ != 0:
             lap_mat = lap_norm(X, n_neighbour=self.k_neighbour, mode=self.knn_mode)
-            Q_ = unit_mat + multi_dot([(self.lambda_ * M + self.gamma_ * lap_mat), ker_x])
-        else:
-            Q_ = unit_mat + multi_dot([(self.lambda_ * M), ker_x])
+            A += self.gamma_ * lap_mat
+        Q_ = A @ ker_x
+        np.add(Q_, unit_mat, out=Q_)
 
-        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver)
+        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver,
+                                                          self.warm_start)
+        self.ker_x_ = ker_x
         # if self._lb.y_type_ == 'binary':
         #     self.support_vectors_ = X[:nl, :][self.support_]
         #     self.n_support_ = self.support_vectors_.shape[0]
@@ -171,9 +181,10 @@ class ARSVM(SSLFramework):
         check_is_fitted(self, 'X')
         check_is_fitted(self, 'y')
         # X_fit = self.X
+        X = _as_array(X)
         ker_x = pairwise_kernels(X, self.X, metric=self.kernel, filter_params=True, **self.kwargs)
 
-        return np.dot(ker_x, self.coef_)  # +self.intercept_
+        return self._decision_from_ker(ker_x)
 
     def predict(self, X):
         """Perform classification on samples in X.
@@ -188,13 +199,7 @@ class ARSVM(SSLFramework):
         array-like
             predicted labels, , shape (n_samples, )
         """
-        dec = self.decision_function(X)
-        if self._lb.y_type_ == 'binary':
-            y_pred_ = np.sign(dec).reshape(-1, 1)
-        else:
-            y_pred_ = score2pred(dec)
-
-        return self._lb.inverse_transform(y_pred_)
+        return self._dec2label(self.decision_function(X))
 
     def fit_predict(self, Xs, ys, Xt=None, yt=None):
         """Fit the model according to the given training data and then perform
@@ -213,8 +218,8 @@ class ARSVM(SSLFramework):
             Target label, shape (ntl_samples, ), by default None
         """
         self.fit(Xs, ys, Xt, yt)
-
-        return self.predict(self.X)
+        # reuse the training kernel matrix instead of recomputing it
+        return self._dec2label(self._decision_from_ker(self.ker_x_))
 
 
 class ARRLS(SSLFramework):
@@ -276,21 +281,22 @@ class ARRLS(SSLFramework):
         """
         X, y, ker_x, M, unit_mat = _init_artl(Xs, ys, Xt, yt, metric=self.kernel,
                                               filter_params=True, **self.kwargs)
-        n = ker_x.shap[0]
+        n = ker_x.shape[0]
         nl = y.shape[0]
-        J = np.zeros((n, n))
-        J[:nl, :nl] = np.eye(nl)
 
+        # J @ ker_x with J = diag(1, ..., 1, 0, ..., 0) keeps the first nl rows
+        Q_ = np.zeros_like(ker_x)
+        Q_[:nl] = ker_x[:nl]
+        Q_ += self.lambda_ * np.dot(M, ker_x)
         if self.gamma_ != 0:
             lap_mat = lap_norm(X, n_neighbour=self.k_neighbour,
                                metric=self.manifold_metric, mode=self.knn_mode)
-            Q_ = np.dot((J + self.lambda_ * M + self.gamma_ * lap_mat),
-                        ker_x) + self.sigma_ * unit_mat
-        else:
-            Q_ = np.dot((J + self.lambda_ * M), ker_x) + self.sigma_ * unit_mat
+            Q_ += self.gamma_ * np.dot(lap_mat, ker_x)
+        Q_.flat[::n + 1] += self.sigma_
 
         y_ = self._lb.fit_transform(y)
         self.coef_ = self._solve_semi_ls(Q_, y_)
+        self.ker_x_ = ker_x
 
         self.X = X
         self.y = y
@@ -309,13 +315,7 @@ class ARRLS(SSLFramework):
         array-like
             predicted labels, shape (n_samples)
         """
-        dec = self.decision_function(X)
-        if self._lb.y_type_ == 'binary':
-            y_pred_ = np.sign(dec).reshape(-1, 1)
-        else:
-            y_pred_ = score2pred(dec)
-
-        return self._lb.inverse_transform(y_pred_)
+        return self._dec2label(self.decision_function(X))
 
     def decision_function(self, X):
         """Evaluates the decision function for the samples in X.
@@ -329,9 +329,10 @@ class ARRLS(SSLFramework):
         array-like
             prediction scores, shape (n_samples)
         """
+        X = _as_array(X)
         ker_x = pairwise_kernels(X, self.X, metric=self.kernel,
                                  filter_params=True, **self.kwargs)
-        return np.dot(ker_x, self.coef_)
+        return self._decision_from_ker(ker_x)
 
     def fit_predict(self, Xs, ys, Xt=None, yt=None):
         """Fit the model according to the given training data and then perform
@@ -350,5 +351,6 @@ class ARRLS(SSLFramework):
             Target label, shape (ntl_samples, ), by default None
         """
         self.fit(Xs, ys, Xt, yt)
-
-        return self.predict(Xt)
+        # rows of the training kernel matrix belonging to Xt
+        ns = len(ys)
+        return self._dec2label(self._decision_from_ker(self.ker_x_[ns:]))
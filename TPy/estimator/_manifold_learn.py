@@ -19,7 +19,7 @@ from .base import SSLFramework
 
 class LapSVM(SSLFramework):
     def __init__(self, C=1.0, kernel='linear', gamma_=1.0, solver='osqp', k_neighbour=3,
-                 manifold_metric='cosine', knn_mode='distance', **kwargs):
+                 manifold_metric='cosine', knn_mode='distance', warm_start=False, **kwargs):
         """Laplacian Regularized Support Vector Machine
         
         Parameters
@@ -44,6 +44,10 @@ class LapSVM(SSLFramework):
             returned matrix: ‘connectivity’ will return the connectivity 
             matrix with ones and zeros, and ‘distance’ will return the 
             distances between neighbors according to the given metric.
+        warm_start : bool, optional
+            whether the osqp solve of each one-vs-rest class is warm started
+            from the previous class, by default False. At the default osqp
+            tolerances the solution can then differ from independent solves
         **kwargs: 
             kernel param
         """
@@ -51,6 +55,7 @@ class LapSVM(SSLFramework):
         self.gamma_ = gamma_
         self.kernel = kernel
         self.solver = solver
+        self.warm_start = warm_start
         self.kwargs = kwargs
         self.manifold_metric = manifold_metric
         self.k_neighbour = k_neighbour
@@ -80,7 +85,8 @@ class LapSVM(SSLFramework):
             Q_ = ctr_mat + self.gamma_ * np.dot(lap_mat, ker_x)
 
         y_ = self._lb.fit_transform(y)
-        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver)
+        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver,
+                                                          self.warm_start)
         # if self._lb.y_type_ == 'binary':
         #     self.support_vectors_ = X[:nl, :][self.support_]
         #     self.n_support_ = self.support_vectors_.shape[0]
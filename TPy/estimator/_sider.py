@@ -21,7 +21,8 @@ from .base import SSLFramework
 
 class SIDeRSVM(SSLFramework):
     def __init__(self, C=1.0, kernel='linear', lambda_=1.0, mu=0.0, k_neighbour=3,
-                 manifold_metric='cosine', knn_mode='distance', solver='osqp', **kwargs):
+                 manifold_metric='cosine', knn_mode='distance', solver='osqp',
+                 warm_start=False, **kwargs):
         """Side Information Dependence Regularised Support Vector Machine
 
         Parameters
@@ -48,6 +49,10 @@ class SIDeRSVM(SSLFramework):
             distances between neighbors according to the given metric.
         solver : str, optional
             quadratic programming solver, [cvxopt, osqp], by default 'osqp'
+        warm_start : bool, optional
+            whether the osqp solve of each one-vs-rest class is warm started
+            from the previous class, by default False. At the default osqp
+            tolerances the solution can then differ from independent solves
         """
         self.kwargs = kwargs
         self.kernel = kernel
@@ -55,6 +60,7 @@ class SIDeRSVM(SSLFramework):
         self.mu = mu
         self.C = C
         self.solver = solver
+        self.warm_start = warm_start
         # self.scaler = StandardScaler()
         # self.coef_ = None
         # self.X = None
@@ -98,7 +104,8 @@ class SIDeRSVM(SSLFramework):
         else:
             Q_ += self.lambda_ * multi_dot([ctr_mat, ker_c, ctr_mat, ker_x]) / np.square(n - 1)
 
-        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver)
+        self.coef_, self.support_ = self._solve_semi_dual(ker_x, y_, Q_, self.C, self.solver,
+                                                          self.warm_start)
 
         # if self._lb.y_type_ == 'binary':
         #     self.coef_, self.support_ = self._semi_binary_dual(K, y_, Q_,
@@ -1,10 +1,10 @@
-import warnings
 import numpy as np
-from numpy.linalg import multi_dot, inv
+from numpy.linalg import inv
 import scipy.sparse as sparse
 from sklearn.base import BaseEstimator, ClassifierMixin
 from cvxopt import matrix, solvers
 import osqp
+from ..utils.multiclass import score2pred
 
 
 class SSLFramework(BaseEstimator, ClassifierMixin):
@@ -12,7 +12,7 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
     """
 
     @classmethod
-    def _solve_semi_dual(cls, K, y, Q_, C, solver='osqp'):
+    def _solve_semi_dual(cls, K, y, Q_, C, solver='osqp', warm_start=False):
         """[summary]
 
         Parameters
@@ -27,20 +27,31 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
             [description]
         solver : str, optional
             [description], by default 'osqp'
+        warm_start : bool, optional
+            whether the osqp problem of a binary sub-problem is reused and
+            warm started for the next one, by default False
 
         Returns
         -------
         [type]
             [description]
         """
+        nl = y.shape[0]
+        # Q_inv J^T and J K Q_inv J^T are shared by all the binary sub-problems
+        Q_inv_jt = inv(Q_)[:, :nl]
+        KQ = np.dot(K[:nl], Q_inv_jt)
         if len(y.shape) == 1:
-            coef_, support_ = cls._semi_binary_dual(K, y, Q_, C, solver)
+            coef_, support_, _ = cls._semi_binary_dual(KQ, Q_inv_jt, y, C, solver)
             support_ = [support_]
         else:
             coef_ = []
             support_ = []
+            prob = None
             for i in range(y.shape[1]):
-                coef_i, support_i = cls._semi_binary_dual(K, y[:, i], Q_, C, solver)
+                coef_i, support_i, prob = cls._semi_binary_dual(KQ, Q_inv_jt, y[:, i],
+                                                                C, solver, prob)
+                if not warm_start:
+                    prob = None
                 coef_.append(coef_i.reshape(-1, 1))
                 support_.append(support_i)
 
@@ -49,42 +60,40 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
         return coef_, support_
 
     @classmethod
-    def _semi_binary_dual(cls, K, y_, Q_, C, solver='osqp'):
+    def _semi_binary_dual(cls, KQ, Q_inv_jt, y_, C, solver='osqp', prob=None):
         """solve min_x x^TPx + q^Tx, s.t. Gx<=h, Ax=b
 
         Parameters
         ----------
-        K : [type]
-            [description]
+        KQ : [type]
+            J K Q_^{-1} J^T, shape (nl_samples, nl_samples)
+        Q_inv_jt : [type]
+            Q_^{-1} J^T, shape (n_samples, nl_samples)
         y_ : [type]
             [description]
-        Q_ : [type]
-            [description]
         C : [type]
             [description]
         solver : str, optional
             [description], by default 'osqp'
+        prob : osqp.OSQP, optional
+            OSQP problem set up for a previous sub-problem, by default None
 
         Returns
         -------
         [type]
             [description]
         """
-        nl = y_.shape[0]
-        n = K.shape[0]
-        J = np.zeros((nl, n))
-        J[:nl, :nl] = np.eye(nl)
-        Q_inv = inv(Q_)
-        Y = np.diag(y_.reshape(-1))
-        Q = multi_dot([Y, J, K, Q_inv, J.T, Y])
+        y_ = y_.reshape(-1)
+        # Y J K Q_inv J^T Y, with Y = diag(y_)
+        Q = y_[:, None] * KQ * y_[None, :]
         Q = Q.astype('float32')
-        alpha = cls._quadprog(Q, y_, C, solver)
-        coef_ = multi_dot([Q_inv, J.T, Y, alpha])
+        alpha, prob = cls._quadprog(Q, y_, C, solver, prob)
+        coef_ = np.dot(Q_inv_jt, y_ * alpha)
         support_ = np.where((alpha > 0) & (alpha < C))
-        return coef_, support_
+        return coef_, support_, prob
 
     @classmethod
-    def _quadprog(cls, Q, y, C, solver='osqp'):
+    def _quadprog(cls, Q, y, C, solver='osqp', prob=None):
         """solve min_x x^TPx + q^Tx, s.t. Gx<=h, Ax=b
 
         Parameters
@@ -97,6 +106,10 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
             [description]
         solver : str, optional
             [description], by default 'osqp'
+        prob : osqp.OSQP, optional
+            OSQP problem set up for a previous problem of the same size, it is
+            updated in place and warm started from its last solution, by
+            default None
 
         Returns
         -------
@@ -128,23 +141,32 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
             alpha = np.array(sol['x']).reshape(nl)
 
         elif solver == 'osqp':
-            warnings.simplefilter('ignore', sparse.SparseEfficiencyWarning)
-            P = sparse.csc_matrix((nl, nl))
-            P[:nl, :nl] = Q[:nl, :nl]
+            # upper triangle of Q in CSC order, the sparsity pattern is kept
+            # full so that it does not change between sub-problems
+            col_idx, row_idx = np.tril_indices(nl)
+            P_x = Q[row_idx, col_idx]
             G = sparse.vstack([sparse.eye(nl), y.reshape(1, -1)]).tocsc()
-            l_ = np.zeros((nl + 1, 1))
-            u = np.zeros(l_.shape)
-            u[:nl, 0] = C
 
-            prob = osqp.OSQP()
-            prob.setup(P, q, G, l_, u, verbose=False)
+            if prob is None:
+                P = sparse.csc_matrix((P_x, row_idx, np.cumsum(np.arange(nl + 1))),
+                                      shape=(nl, nl))
+                l_ = np.zeros((nl + 1, 1))
+                u = np.zeros(l_.shape)
+                u[:nl, 0] = C
+
+                prob = osqp.OSQP()
+                prob.setup(P, q, G, l_, u, verbose=False)
+            else:
+                # same sparsity pattern, q, l and u, only update the matrix
+                # values, the solve is warm started from the last solution
+                prob.update(Px=P_x, Ax=G.data)
             res = prob.solve()
             alpha = res.x
 
         else:
             raise ValueError('Invalid QP solver')
 
-        return alpha
+        return alpha, prob
 
     @classmethod
     def _solve_semi_ls(cls, Q, y):
@@ -172,3 +194,40 @@ class SSLFramework(BaseEstimator, ClassifierMixin):
             y_ = np.zeros((n, y.shape[1]))
             y_[:nl, :] = y[:, :]
         return np.dot(Q_inv, y_)
+
+    def _decision_from_ker(self, ker):
+        """Evaluates the decision function from a precomputed kernel matrix.
+
+        Parameters
+        ----------
+        ker : array-like
+            kernel matrix between samples and training data,
+            shape (n_samples, n_train_samples)
+
+        Returns
+        -------
+        array-like
+            decision scores
+        """
+        return np.dot(ker, self.coef_)
+
+    def _dec2label(self, dec):
+        """Converts decision scores to labels.
+
+        Parameters
+        ----------
+        dec : array-like
+            decision scores, shape (n_samples,) for binary classification,
+            (n_samples, n_class) for multi-class cases
+
+        Returns
+        -------
+        array-like
+            predicted labels, shape (n_samples,)
+        """
+        if self._lb.y_type_ == 'binary':
+            y_pred_ = np.sign(dec).reshape(-1, 1)
+        else:
+            y_pred_ = score2pred(dec)
+
+        return self._lb.inverse_transform(y_pred_)
@@ -2,10 +2,10 @@
 # author: Shuo Zhou, The University of Sheffield
 # =============================================================================
 import numpy as np
-from scipy.linalg import eig
+from scipy.linalg import eig, eigh, LinAlgError
 from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.metrics.pairwise import pairwise_kernels
-from ..utils import mmd_coef, base_init
+from ..utils import mmd_coef_factor, base_init, blocked_kernels
+from ..utils._base import _as_array, _stack
 # from sklearn.preprocessing import StandardScaler
 # =============================================================================
 # Implementation of three transfer learning methods:
@@ -26,7 +26,8 @@ from ..utils import mmd_coef, base_init
 
 
 class JDA(BaseEstimator, TransformerMixin):
-    def __init__(self, n_components, kernel='linear', lambda_=1.0, mu=1.0, **kwargs):
+    def __init__(self, n_components, kernel='linear', lambda_=1.0, mu=1.0,
+                 backend='numpy', dtype=np.float32, **kwargs):
         """
         Parameters
             n_components: n_components after (n_components <= min(d, n))
@@ -35,12 +36,18 @@ class JDA(BaseEstimator, TransformerMixin):
             **kwargs: kernel param
             lambda_: regulisation param
             mu: >= 0, param for conditional mmd, (mu=0 for TCA, mu=1 for JDA, BDA otherwise)
+            backend: 'numpy' | 'cupy', 'cupy' computes the kernel and solves
+            the eigenproblem on GPU, requires cupy and cuml (default is 'numpy')
+            dtype: dtype of the projection matrix and of the projection in
+            transform (default is np.float32)
         """
         self.n_components = n_components
         self.kwargs = kwargs
         self.kernel = kernel
         self.lambda_ = lambda_
         self.mu = mu
+        self.backend = backend
+        self.dtype = dtype
 
     def fit(self, Xs, ys=None, Xt=None, yt=None):
         """
@@ -56,39 +63,134 @@ class JDA(BaseEstimator, TransformerMixin):
         yt : array-like, optional
             Target domain labels, shape (nt_samples,), by default None.
         """
-        if type(Xt) == np.ndarray:
-            X = np.vstack((Xs, Xt))
+        Xs = _as_array(Xs)
+        if Xt is not None:
+            Xt = _as_array(Xt)
+            X = _stack(Xs, Xt)
             ns = Xs.shape[0]
             nt = Xt.shape[0]
 
+            # low rank factor of the mmd coefficients, L = F diag(w) F^T
             if ys is not None and yt is not None:
-                L = mmd_coef(ns, nt, ys, yt, kind='joint', mu=self.mu)
+                F, w = mmd_coef_factor(ns, nt, ys, yt, kind='joint', mu=self.mu)
             else:
-                L = mmd_coef(ns, nt, kind='marginal', mu=0)
+                F, w = mmd_coef_factor(ns, nt, kind='marginal', mu=0)
         else:
             X = Xs
-            L = np.zeros((X.shape[0], X.shape[0]))
-
-        ker_x, unit_mat, ctr_mat, n = base_init(X, kernel=self.kernel, **self.kwargs)
-
-        # objective for optimization
-        obj = np.dot(np.dot(ker_x, L), ker_x.T) + self.lambda_ * unit_mat
-        # constraint subject to
-        st = np.dot(np.dot(ker_x, ctr_mat), ker_x.T)
-        eig_values, eig_vectors = eig(obj, st)
-        
-        ev_abs = np.array(list(map(lambda item: np.abs(item), eig_values)))
-#        idx_sorted = np.argsort(ev_abs)[:self.n_components]
-        idx_sorted = np.argsort(ev_abs)
-        
-        U = np.zeros(eig_vectors.shape)
-        U[:, :] = eig_vectors[:, idx_sorted]
-        self.U = np.asarray(U, dtype=np.float)
-        self.Xs = Xs
-        self.Xt = Xt
+            F, w = np.zeros((X.shape[0], 1)), np.zeros(1)
+
+        if self.backend == 'cupy':
+            self.U = self._fit_cupy(X, F, w)
+            self.X = X
+            self.Xs = X[:Xs.shape[0]]
+            self.Xt = None if Xt is None else X[Xs.shape[0]:]
+
+            return self
+        elif self.backend != 'numpy':
+            raise ValueError('Invalid backend, use numpy or cupy')
+
+        ker_x, unit_mat, ctr_mat, n = base_init(X, kernel=self.kernel, centering=False,
+                                                **self.kwargs)
+
+        # ker_x is symmetric, so ker_x.T can be replaced by ker_x
+        # objective for optimization, ker_x L ker_x = (ker_x F) diag(w) (ker_x F)^T
+        # only needs products with the n x (n_class + 1) matrix ker_x F
+        ker_f = np.dot(ker_x, F)
+        if np.all(w >= 0):
+            ker_f *= np.sqrt(w)
+            obj = np.dot(ker_f, ker_f.T)
+        else:
+            obj = np.dot(ker_f * w, ker_f.T)
+        obj.flat[::n + 1] += self.lambda_
+        # constraint subject to, the centering matrix H is symmetric and
+        # idempotent, so ker_x H ker_x = (H ker_x)^T (H ker_x), where H ker_x
+        # is ker_x with its columns centred
+        ker_c = ker_x - ker_x.mean(axis=0, keepdims=True)
+        st = np.dot(ker_c.T, ker_c)
+        # obj and st are symmetric by construction, remove round-off asymmetry
+        # so that the symmetric solver can be used
+        obj = 0.5 * (obj + obj.T)
+        st = 0.5 * (st + st.T)
+        k = self.n_components
+        try:
+            # st is singular but obj is positive definite, so solve the
+            # swapped problem st u = 1/phi obj u, whose n_components largest
+            # eigenvalues correspond to the smallest phi of obj u = phi st u
+            eig_values, eig_vectors = eigh(st, obj, subset_by_index=[n - k, n - 1])
+            eig_vectors = eig_vectors[:, ::-1]
+            eig_vectors /= np.linalg.norm(eig_vectors, axis=0)
+        except LinAlgError:
+            # obj is not positive definite (e.g. mu > 1), use the general solver
+            eig_values, eig_vectors = eig(obj, st)
+            ev_abs = np.abs(eig_values)
+            # select the n_components smallest eigenvalues, only sort those
+            part = np.argpartition(ev_abs, k - 1)[:k]
+            idx_sorted = part[np.argsort(ev_abs[part])]
+            eig_vectors = eig_vectors[:, idx_sorted]
+
+        self.U = np.ascontiguousarray(eig_vectors.real, dtype=self.dtype)
+        self.X = X
+        # keep Xs and Xt as views of X rather than second copies
+        self.Xs = X[:Xs.shape[0]]
+        self.Xt = None if Xt is None else X[Xs.shape[0]:]
 
         return self
     
+    def _fit_cupy(self, X, F, w):
+        """Solve the JDA eigenproblem on GPU.
+
+        Parameters
+        ----------
+        X : array-like
+            Input data, shape (n_samples, n_features)
+        F : array-like
+            low rank factor of the MMD coefficient matrix,
+            shape (n_samples, n_factors)
+        w : array-like
+            weight of each column of F, shape (n_factors,)
+
+        Returns
+        -------
+        array-like
+            projection matrix, shape (n_samples, n_components)
+        """
+        import cupy as cp
+        import cupyx
+        from cupyx.scipy.linalg import solve_triangular
+        from cuml.metrics import pairwise_kernels as cu_pairwise_kernels
+
+        n = X.shape[0]
+        k = self.n_components
+        ker_x = cp.asarray(cu_pairwise_kernels(cp.asarray(X), metric=self.kernel,
+                                               filter_params=True, **self.kwargs))
+        cp.nan_to_num(ker_x, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        diag_idx = cp.arange(n)
+
+        ker_f = ker_x @ cp.asarray(F)
+        obj = (ker_f * cp.asarray(w)) @ ker_f.T
+        obj[diag_idx, diag_idx] += self.lambda_
+        ker_c = ker_x - ker_x.mean(axis=0, keepdims=True)
+        st = ker_c.T @ ker_c
+        obj = 0.5 * (obj + obj.T)
+        st = 0.5 * (st + st.T)
+
+        # cupy has no generalised symmetric solver, reduce st u = 1/phi obj u
+        # to a standard problem with the Cholesky factor obj = C C^T
+        try:
+            with cupyx.errstate(linalg='raise'):
+                C = cp.linalg.cholesky(obj)
+        except LinAlgError:
+            raise ValueError('Objective matrix is not positive definite, '
+                             'use the numpy backend')
+        tmp = solve_triangular(C, st, lower=True)
+        A = solve_triangular(C, tmp.T, lower=True)
+        eig_values, eig_vectors = cp.linalg.eigh(0.5 * (A + A.T))
+        eig_vectors = eig_vectors[:, ::-1][:, :k]
+        U = solve_triangular(C, eig_vectors, lower=True, trans='T')
+        U /= cp.linalg.norm(U, axis=0)
+
+        return np.ascontiguousarray(cp.asnumpy(U), dtype=self.dtype)
+
     def transform(self, X):
         """
         Parameters
@@ -104,10 +206,11 @@ class JDA(BaseEstimator, TransformerMixin):
         # X = self.scaler.transform(X)
         # check_is_fitted(self, 'Xs')
         # check_is_fitted(self, 'Xt')
-        X_fit = np.vstack((self.Xs, self.Xt))
-        ker_x = pairwise_kernels(X, X_fit, metric=self.kernel, filter_params=True, **self.kwargs)
+        X = _as_array(X)
+        ker_x = blocked_kernels(X, self.X, metric=self.kernel, filter_params=True,
+                                dtype=self.dtype, **self.kwargs)
 
-        return np.dot(ker_x, self.U[:, :self.n_components])
+        return np.dot(ker_x, self.U)
     
     def fit_transform(self, Xs, ys=None, Xt=None, yt=None):
         """
@@ -9,6 +9,7 @@ from sklearn.metrics.pairwise import pairwise_kernels
 from sklearn.preprocessing import LabelBinarizer
 # from sklearn.utils.validation import check_is_fitted
 from ..utils import lap_norm, mmd_coef, base_init
+from ..utils._base import _as_array, _stack
 
 
 class TCA(BaseEstimator, TransformerMixin):
@@ -62,8 +63,10 @@ class TCA(BaseEstimator, TransformerMixin):
         yt : array-like, optional
             Target domain labels, shape (nt_samples,), by default None
         """
-        if type(Xt) == np.ndarray:
-            X = np.vstack((Xs, Xt))
+        Xs = _as_array(Xs)
+        if Xt is not None:
+            Xt = _as_array(Xt)
+            X = _stack(Xs, Xt)
             ns = Xs.shape[0]
             nt = Xt.shape[0]
             L = mmd_coef(ns, nt, kind='marginal', mu=0)
@@ -97,8 +100,10 @@ class TCA(BaseEstimator, TransformerMixin):
         idx_sorted = eig_values.argsort()
 
         self.U = np.asarray(eig_vectors[:, idx_sorted], dtype=np.float)
-        self.Xs = Xs
-        self.Xt = Xt
+        self.X = X
+        # keep Xs and Xt as views of X rather than second copies
+        self.Xs = X[:Xs.shape[0]]
+        self.Xt = None if Xt is None else X[Xs.shape[0]:]
 
         return self
 
@@ -116,8 +121,8 @@ class TCA(BaseEstimator, TransformerMixin):
         """
         # check_is_fitted(self, 'Xs')
         # check_is_fitted(self, 'Xt')
-        X_fit = np.vstack((self.Xs, self.Xt))
-        ker_x = pairwise_kernels(X, X_fit, metric=self.kernel,
+        X = _as_array(X)
+        ker_x = pairwise_kernels(X, self.X, metric=self.kernel,
                                  filter_params=True, **self.kwargs)
 
         return np.dot(ker_x, self.U[:, :self.n_components])
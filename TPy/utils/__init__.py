@@ -1,3 +1,6 @@
 from ._base import lap_norm
 from ._base import mmd_coef
+from ._base import mmd_coef_factor
 from ._base import base_init
+from ._base import sym_kernel
+from ._base import blocked_kernels
@@ -1,9 +1,16 @@
 import numpy as np
 from numpy.linalg import multi_dot, inv
 from scipy.linalg import sqrtm
+import scipy.sparse as sparse
 from sklearn.metrics import pairwise_distances
 from sklearn.metrics.pairwise import pairwise_kernels
 from sklearn.neighbors import kneighbors_graph
+from joblib import Parallel, delayed
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
 
 
 def lap_norm(X, n_neighbour=3, metric='cosine', mode='distance',
@@ -51,41 +58,215 @@ def lap_norm(X, n_neighbour=3, metric='cosine', mode='distance',
     return lap_mat
 
 
-def mmd_coef(ns, nt, ys=None, yt=None, kind='marginal', mu=0.5):
+def mmd_coef_factor(ns, nt, ys=None, yt=None, kind='marginal', mu=0.5):
+    """Low rank factorisation of the mmd coefficient matrix.
+
+    Parameters
+    ----------
+    ns : int
+        number of source samples
+    nt : int
+        number of target samples
+    ys : array-like, optional
+        Source labels, shape (ns_samples,), by default None
+    yt : array-like, optional
+        Target labels, shape (ntl_samples,), by default None
+    kind : str, optional
+        'marginal' | 'joint', by default 'marginal'
+    mu : float, optional
+        param for conditional mmd, by default 0.5
+
+    Returns
+    -------
+    F : array-like
+        shape (ns + nt, n_class + 1) for joint mmd, (ns + nt, 1) otherwise,
+        the first column holds the marginal mmd coefficients and the others
+        the class-wise ones
+    w : array-like
+        weight of each column of F, such that mmd_coef = F diag(w) F^T
+    """
     n = ns + nt
     e = np.zeros((n, 1))
     e[:ns, 0] = 1.0 / ns
     e[ns:, 0] = -1.0 / nt
-    M = np.dot(e, e.T)  # marginal mmd coefficients
 
     if kind == 'joint' and ys is not None:
-        Mc = 0  # conditional mmd coefficients
         class_all = np.unique(ys)
         if yt is not None and class_all.all() != np.unique(yt).all():
             raise ValueError('Source and target domain should have the same labels')
 
-        for c in class_all:
-            es = np.zeros([ns, 1])
-            es[np.where(ys == c)] = 1.0 / (np.where(ys == c)[0].shape[0])
-            et = np.zeros([nt, 1])
-            if yt is not None:
-                et[np.where(yt == c)[0]] = -1.0 / np.where(yt == c)[0].shape[0]
-            e = np.vstack((es, et))
-            e[np.where(np.isinf(e))[0]] = 0
-            Mc = Mc + mu * np.dot(e, e.T)
-        M = (1 - mu) * M + mu *  Mc  # joint mmd coefficients
-    return M
+        # class membership of all samples in one comparison per domain
+        E = np.zeros((n, class_all.shape[0]))
+        ys_eq = ys[:, None] == class_all[None, :]
+        E[:ns] = ys_eq / ys_eq.sum(axis=0)
+        if yt is not None:
+            yt_eq = yt[:, None] == class_all[None, :]
+            n_yt = yt_eq.sum(axis=0)
+            E[ns:ns + yt.shape[0]] = -1.0 * np.divide(yt_eq, n_yt, out=np.zeros(yt_eq.shape),
+                                                      where=n_yt > 0)
+
+        F = np.concatenate([e, E], axis=1)
+        w = np.full(F.shape[1], mu * mu)
+        w[0] = 1 - mu
+        return F, w
+
+    return e, np.ones(1)
+
+
+def mmd_coef(ns, nt, ys=None, yt=None, kind='marginal', mu=0.5):
+    F, w = mmd_coef_factor(ns, nt, ys, yt, kind=kind, mu=mu)
+
+    if _HAS_NUMBA and F.shape[1] > 1:
+        # each class-wise column has at most one non-zero entry per row, pass
+        # it as a (class index, coefficient) pair and fill M in a single pass
+        E = F[:, 1:]
+        cls = np.where(E.any(axis=1), np.argmax(E != 0, axis=1), -1)
+        return _joint_mmd_coef(F[:, 0], E.sum(axis=1), cls, w)
+
+    # (1 - mu) * marginal + mu^2 * conditional mmd coefficients
+    return np.dot(F * w, F.T)
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _joint_mmd_coef(e, v, cls, w):
+        """Joint mmd coefficients [e, E] diag(w) [e, E]^T, where row i of E
+        has the single non-zero entry v[i] in column cls[i] (-1 if none)
+        """
+        n = e.shape[0]
+        M = np.empty((n, n))
+        for i in prange(n):
+            for j in range(n):
+                m = w[0] * e[i] * e[j]
+                if cls[i] >= 0 and cls[i] == cls[j]:
+                    m += w[cls[i] + 1] * v[i] * v[j]
+                M[i, j] = m
+        return M
+
+
+def _as_array(X):
+    """Convert X to a numpy array, sparse matrices are kept sparse in CSR
+    format so that they can be sliced by rows.
+    """
+    if sparse.issparse(X):
+        return X.tocsr()
+    return np.asarray(X)
+
+
+def _stack(Xs, Xt):
+    """Stack source and target data by rows, sparse if either is sparse."""
+    if sparse.issparse(Xs) or sparse.issparse(Xt):
+        return sparse.vstack((Xs, Xt), format='csr')
+    return np.vstack((Xs, Xt))
+
+
+def blocked_kernels(X, Y=None, metric='linear', filter_params=False,
+                    block_size=512, n_jobs=None, dtype=np.float64, **kwargs):
+    """Compute the kernel matrix between X and Y in row blocks of X, so that
+    each block of X stays in cache while it is evaluated against all of Y.
+
+    Parameters
+    ----------
+    X : array-like or sparse matrix
+        Input data, shape (n_samples_X, n_features)
+    Y : array-like or sparse matrix, optional
+        Input data, shape (n_samples_Y, n_features), by default None. If None,
+        the kernel matrix of X with itself is computed, only the blocks on
+        and above the diagonal are evaluated and the rest is mirrored.
+    metric : str, optional
+        kernel type, by default 'linear'
+    filter_params : bool, optional
+        passed to pairwise_kernels, by default False
+    block_size : int, optional
+        number of rows of X per block, by default 512
+    n_jobs : int, optional
+        number of threads evaluating the blocks, by default None
+    dtype : data-type, optional
+        dtype of the returned kernel matrix, each block is cast when it is
+        written, by default np.float64
+    kwargs :
+        kernel param
+
+    Returns
+    -------
+    array-like
+        kernel matrix, shape (n_samples_X, n_samples_Y)
+    """
+    if metric == 'precomputed':
+        # a precomputed kernel is validated against the whole of Y, so it
+        # cannot be split into row blocks
+        ker = pairwise_kernels(X, Y, metric=metric, filter_params=filter_params, **kwargs)
+        return ker.astype(dtype, copy=False)
+
+    X = _as_array(X)
+    symmetric = Y is None
+    if symmetric:
+        Y = X
+    else:
+        Y = _as_array(Y)
+    n = X.shape[0]
+    ker = np.empty((n, Y.shape[0]), dtype=dtype)
+    starts = range(0, n, block_size)
+
+    def _fill_block(i0):
+        i1 = min(i0 + block_size, n)
+        j0 = i0 if symmetric else 0
+        ker[i0:i1, j0:] = pairwise_kernels(X[i0:i1], Y[j0:], metric=metric,
+                                           filter_params=filter_params, **kwargs)
+
+    Parallel(n_jobs=n_jobs, prefer='threads')(delayed(_fill_block)(i0) for i0 in starts)
+
+    if symmetric:
+        for i0 in starts:
+            i1 = min(i0 + block_size, n)
+            ker[i0:i1, :i0] = ker[:i0, i0:i1].T
+
+    return ker
 
 
-def base_init(X, kernel='linear', **kwargs):
+def sym_kernel(X, metric='linear', filter_params=False, **kwargs):
+    """Compute the (symmetric) kernel matrix of X with itself.
+
+    Linear and rbf kernels, and sparse X, are passed to pairwise_kernels,
+    which already builds them on a single X X^T product. Other kernels are
+    evaluated block-wise by blocked_kernels.
+
+    Parameters
+    ----------
+    X : array-like
+        Input data, shape (n_samples, n_features)
+    metric : str, optional
+        kernel type, by default 'linear'
+    filter_params : bool, optional
+        passed to pairwise_kernels, by default False
+    kwargs :
+        kernel param
+
+    Returns
+    -------
+    array-like
+        kernel matrix, shape (n_samples, n_samples)
+    """
+    if metric in ('linear', 'rbf') or sparse.issparse(X):
+        return pairwise_kernels(X, metric=metric, filter_params=filter_params, **kwargs)
+
+    return blocked_kernels(X, metric=metric, filter_params=filter_params, **kwargs)
+
+
+def base_init(X, kernel='linear', centering=True, **kwargs):
 
     n = X.shape[0]
     # Construct kernel matrix
-    ker_x = pairwise_kernels(X, metric=kernel, filter_params=True, **kwargs)
-    ker_x[np.isnan(ker_x)] = 0
+    ker_x = sym_kernel(X, metric=kernel, filter_params=True, **kwargs)
+    np.nan_to_num(ker_x, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
 
-    unit_mat = np.eye(n)
-    # Construct centering matrix
-    ctr_mat = unit_mat - 1. / n * np.ones((n, n))
+    # Construct unit and centering matrices, callers applying the centering
+    # as a mean subtraction (H A = A - mean(A, axis=0)) can skip both
+    if centering:
+        unit_mat = np.eye(n)
+        ctr_mat = unit_mat - 1. / n * np.ones((n, n))
+    else:
+        unit_mat = None
+        ctr_mat = None
 
     return ker_x, unit_mat, ctr_mat, n